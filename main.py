@@ -3,8 +3,17 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List, Any, Dict
 from neo4j import GraphDatabase
-from datetime import datetime
+from neo4j.time import DateTime as Neo4jDateTime
+from datetime import datetime, timezone
+import gzip
+import json
 import logging
+import os
+import re
+import threading
+import time
+import uuid
+import zlib
 
 logging.basicConfig(level=logging.INFO)
 
@@ -23,6 +32,43 @@ NEO4J_USER = "neo4j"
 NEO4J_PASSWORD = "password"
 NEO4J_DATABASE = "test"
 
+# Write-behind mode for likes, purchases and comments. Events are coalesced in
+# memory and written as one UNWIND transaction every FLUSH_INTERVAL_MS or as soon
+# as MAX_EVENTS are pending, whichever comes first.
+WRITE_BEHIND_ENABLED = False
+WRITE_BEHIND_FLUSH_INTERVAL_MS = 200
+WRITE_BEHIND_MAX_EVENTS = 500
+# "none"    - pending events are lost if the process dies before a flush
+# "journal" - every event is appended to WRITE_BEHIND_JOURNAL_PATH and replayed on startup
+# "fsync"   - like "journal", but the file is fsynced before the endpoint returns
+WRITE_BEHIND_DURABILITY = "journal"
+WRITE_BEHIND_JOURNAL_PATH = "write_behind.journal"
+
+# Labels included in graph snapshots (/admin/snapshot/*), in restore order.
+SNAPSHOT_LABELS = ["Department", "Student", "Alumni", "Faculty", "Service_Available", "Comment"]
+SNAPSHOT_BATCH_SIZE = 1000
+# The /admin/snapshot endpoints only read and write bare file names in this directory.
+SNAPSHOT_DIR = "snapshots"
+# Snapshot file used to warm the in-process caches at startup. It should match
+# the database, e.g. the snapshot that was just imported.
+SNAPSHOT_WARM_PATH = None
+# How long a cached user or service is trusted before it is checked against
+# Neo4j again. Bounds how long a service deleted by another worker (or directly
+# in the database) keeps being accepted by write-behind purchases and comments.
+GRAPH_CACHE_TTL_SECONDS = 60
+# Entries loaded from a snapshot (SNAPSHOT_WARM_PATH or an import) are trusted
+# for longer; deleted services are still removed by delete_service, and events
+# that miss at flush time are counted in WriteBehindQueue.dropped_events.
+GRAPH_CACHE_WARM_TTL_SECONDS = 24 * 3600
+
+# Background cleanup of orphaned comments, unanswered friend requests and
+# duplicate friendships. Can also be triggered with POST /admin/maintenance/run.
+MAINTENANCE_ENABLED = False
+MAINTENANCE_INTERVAL_SECONDS = 3600
+MAINTENANCE_BATCH_SIZE = 500
+MAINTENANCE_BATCH_PAUSE_MS = 50
+FRIEND_REQUEST_EXPIRY_DAYS = 30
+
 driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
 
 class LoginModel(BaseModel):
@@ -112,6 +158,10 @@ class DeleteCommentModel(BaseModel):
     user_email: EmailStr
     comment_id: str
 
+class SnapshotModel(BaseModel):
+    name: str
+    replace: Optional[bool] = False
+
 def run_read_query(query: str, params: Dict[str, Any] = None):
     params = params or {}
     with driver.session(database=NEO4J_DATABASE) as session:
@@ -124,6 +174,749 @@ def run_write_query(query: str, params: Dict[str, Any] = None):
     with driver.session(database=NEO4J_DATABASE) as session:
         session.run(query, params)
 
+def utc_now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+WB_LIKE_QUERY = """
+UNWIND $rows AS row
+MATCH (s:Service_Available {name:row.service_name})
+MATCH (u) WHERE u.email = row.user_email
+MERGE (u)-[like:LIKES]->(s)
+SET like.liked_at = datetime(row.liked_at)
+RETURN count(DISTINCT row) AS written
+"""
+
+WB_UNLIKE_QUERY = """
+UNWIND $rows AS row
+MATCH (u)-[like:LIKES]->(s:Service_Available {name:row.service_name})
+WHERE u.email = row.user_email
+DELETE like
+RETURN count(DISTINCT row) AS written
+"""
+
+WB_BUY_QUERY = """
+UNWIND $rows AS row
+MATCH (s:Service_Available {name:row.service_name})
+MATCH (p) WHERE p.email = row.buyer_email
+MERGE (p)-[rel:USED_SERVICE]->(s)
+SET rel.Used_by = row.buyer_email, rel.used_at = datetime(row.used_at)
+RETURN count(DISTINCT row) AS written
+"""
+
+WB_COMMENT_QUERY = """
+UNWIND $rows AS row
+MATCH (s:Service_Available {name:row.service_name})
+MERGE (comment:Comment {id: row.id})
+ON CREATE SET comment.text = row.comment_text,
+              comment.user_email = row.user_email,
+              comment.created_at = datetime(row.created_at)
+MERGE (s)-[:HAS_COMMENT]->(comment)
+RETURN count(DISTINCT row) AS written
+"""
+
+class WriteBehindQueue:
+    """In-process queue that coalesces likes, purchases and comments and
+    writes them to Neo4j in batched UNWIND transactions."""
+
+    def __init__(self, flush_interval_ms: int, max_events: int, durability: str, journal_path: str):
+        if durability not in ("none", "journal", "fsync"):
+            raise ValueError(f"Unknown write-behind durability: {durability}")
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_events = max_events
+        self.durability = durability
+        self.journal_path = journal_path
+        self.inflight_path = journal_path + ".inflight"
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._journal = None
+        self._events = 0
+        # Events whose service or user no longer matched anything when written
+        self.dropped_events = 0
+        self.failed_flushes = 0
+        # (service_name, user_email) -> (state in the database, pending state, liked_at)
+        self._likes = {}
+        self._inflight_likes = {}
+        # (service_name, buyer_email) -> used_at
+        self._buys = {}
+        # comment id -> comment row
+        self._comments = {}
+        self._inflight_comments = {}
+
+    def start(self):
+        replayed = 0
+        if self.durability != "none":
+            self._recover_inflight()
+            replayed = self._replay_journal()
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        if replayed:
+            self._wakeup.set()
+
+    def stop(self):
+        """Stop the flusher thread and write out everything still pending."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            self.flush()
+        finally:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    def liked_state(self, service_name: str, user_email: str) -> Optional[bool]:
+        """Return the liked state still waiting to be written, or None if the
+        database already has the latest state."""
+        key = (service_name, user_email)
+        with self._lock:
+            for pending in (self._likes, self._inflight_likes):
+                if key in pending:
+                    return pending[key][1]
+        return None
+
+    def like(self, service_name: str, user_email: str, base: bool, liked: bool):
+        self._submit({"op": "like", "service_name": service_name, "user_email": user_email,
+                      "base": base, "liked": liked, "at": utc_now_iso()})
+
+    def buy(self, service_name: str, buyer_email: str):
+        self._submit({"op": "buy", "service_name": service_name, "buyer_email": buyer_email,
+                      "used_at": utc_now_iso()})
+
+    def comment(self, service_name: str, user_email: str, comment_text: str) -> Dict[str, Any]:
+        record = {"op": "comment", "id": str(uuid.uuid4()), "service_name": service_name,
+                  "user_email": user_email, "comment_text": comment_text,
+                  "created_at": utc_now_iso()}
+        self._submit(record)
+        return record
+
+    def discard_comment(self, service_name: str, user_email: str, comment_id: str) -> bool:
+        """Drop a comment that has not been written yet. Returns False if the
+        comment is not pending or belongs to someone else. If the comment is in
+        the batch currently being written, waits for that batch to finish so the
+        caller can delete it from the database."""
+        with self._lock:
+            if self._discard_pending_comment(service_name, user_email, comment_id):
+                return True
+            inflight = comment_id in self._inflight_comments
+        if not inflight:
+            return False
+        # Once the batch is done the comment is either in the database or,
+        # if the write failed, back in the pending queue.
+        with self._flush_lock:
+            pass
+        with self._lock:
+            return self._discard_pending_comment(service_name, user_email, comment_id)
+
+    def _discard_pending_comment(self, service_name: str, user_email: str, comment_id: str) -> bool:
+        # Caller holds self._lock.
+        pending = self._comments.get(comment_id)
+        if (pending is None or pending["service_name"] != service_name
+                or pending["user_email"] != user_email):
+            return False
+        self._record({"op": "uncomment", "id": comment_id})
+        return True
+
+    def discard_service(self, service_name: str):
+        """Drop every pending event for a service that is being deleted."""
+        with self._lock:
+            self._record({"op": "drop_service", "service_name": service_name})
+
+    def flush(self) -> int:
+        """Write all pending events in one transaction and return how many were written."""
+        with self._flush_lock:
+            with self._lock:
+                likes, buys, comments = self._likes, self._buys, self._comments
+                self._events = 0
+                if not (likes or buys or comments):
+                    return 0
+                self._likes, self._buys, self._comments = {}, {}, {}
+                self._inflight_likes = likes
+                self._inflight_comments = comments
+                self._rotate_journal()
+            try:
+                self._write(likes, buys, comments)
+            except Exception:
+                self.failed_flushes += 1
+                logger.error("Write-behind flush of %d events failed, requeueing them",
+                             len(likes) + len(buys) + len(comments))
+                with self._lock:
+                    self._requeue(likes, buys, comments)
+                    self._inflight_likes, self._inflight_comments = {}, {}
+                raise
+            with self._lock:
+                self._inflight_likes, self._inflight_comments = {}, {}
+            if os.path.exists(self.inflight_path):
+                os.remove(self.inflight_path)
+            return len(likes) + len(buys) + len(comments)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Write-behind flush failed")
+
+    def _submit(self, record: Dict[str, Any]):
+        with self._lock:
+            self._record(record)
+            self._events += 1
+            if self._events >= self.max_events:
+                self._wakeup.set()
+
+    def _record(self, record: Dict[str, Any]):
+        # Caller holds self._lock so the journal order matches the apply order.
+        self._apply(record)
+        if self._journal is not None:
+            self._journal.write(json.dumps(record) + "\n")
+            self._journal.flush()
+            if self.durability == "fsync":
+                os.fsync(self._journal.fileno())
+
+    def _apply(self, record: Dict[str, Any]):
+        op = record["op"]
+        if op == "like":
+            key = (record["service_name"], record["user_email"])
+            base = self._likes[key][0] if key in self._likes else record["base"]
+            if record["liked"] == base:
+                # A like followed by an unlike (or the reverse) cancels out.
+                self._likes.pop(key, None)
+            else:
+                self._likes[key] = (base, record["liked"], record["at"])
+        elif op == "buy":
+            self._buys[(record["service_name"], record["buyer_email"])] = record["used_at"]
+        elif op == "comment":
+            self._comments[record["id"]] = record
+        elif op == "uncomment":
+            self._comments.pop(record["id"], None)
+        elif op == "drop_service":
+            name = record["service_name"]
+            self._likes = {k: v for k, v in self._likes.items() if k[0] != name}
+            self._buys = {k: v for k, v in self._buys.items() if k[0] != name}
+            self._comments = {k: v for k, v in self._comments.items() if v["service_name"] != name}
+
+    def _requeue(self, likes, buys, comments):
+        # Events submitted while the failed batch was in flight are newer and win.
+        for key, (base, liked, liked_at) in likes.items():
+            newer = self._likes.get(key)
+            if newer is None:
+                self._likes[key] = (base, liked, liked_at)
+            elif newer[1] == base:
+                del self._likes[key]
+            else:
+                self._likes[key] = (base, newer[1], newer[2])
+        for key, used_at in buys.items():
+            self._buys.setdefault(key, used_at)
+        for comment_id, row in comments.items():
+            self._comments.setdefault(comment_id, row)
+
+    def _write(self, likes, buys, comments):
+        like_rows, unlike_rows = [], []
+        for (service_name, user_email), (_, liked, liked_at) in likes.items():
+            row = {"service_name": service_name, "user_email": user_email, "liked_at": liked_at}
+            (like_rows if liked else unlike_rows).append(row)
+        buy_rows = [{"service_name": service_name, "buyer_email": buyer_email, "used_at": used_at}
+                    for (service_name, buyer_email), used_at in buys.items()]
+        comment_rows = list(comments.values())
+        batches = [("likes", WB_LIKE_QUERY, like_rows), ("unlikes", WB_UNLIKE_QUERY, unlike_rows),
+                   ("purchases", WB_BUY_QUERY, buy_rows), ("comments", WB_COMMENT_QUERY, comment_rows)]
+        written = {}
+        with driver.session(database=NEO4J_DATABASE) as session:
+            with session.begin_transaction() as tx:
+                for name, query, rows in batches:
+                    if rows:
+                        written[name] = tx.run(query, {"rows": rows}).single()["written"]
+                tx.commit()
+        summary = ", ".join(f"{written.get(name, 0)}/{len(rows)} {name}" for name, _, rows in batches)
+        dropped = sum(len(rows) - written.get(name, 0) for name, _, rows in batches)
+        if dropped:
+            self.dropped_events += dropped
+            logger.warning("Write-behind flushed %s; %d events matched no service or user and were dropped",
+                           summary, dropped)
+        else:
+            logger.info("Write-behind flushed %s", summary)
+
+    def _rotate_journal(self):
+        # The journal for the batch being written moves to inflight_path and is
+        # only removed once the transaction commits. If an older batch failed,
+        # its inflight file is still there and the new entries are appended to it.
+        if self._journal is None:
+            return
+        self._journal.close()
+        if os.path.exists(self.inflight_path):
+            with open(self.journal_path, encoding="utf-8") as src, \
+                    open(self.inflight_path, "a", encoding="utf-8") as dst:
+                dst.write(src.read())
+                dst.flush()
+                if self.durability == "fsync":
+                    os.fsync(dst.fileno())
+            os.remove(self.journal_path)
+        else:
+            os.replace(self.journal_path, self.inflight_path)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def _read_journal(self, path: str) -> List[Dict[str, Any]]:
+        records = []
+        if not os.path.exists(path):
+            return records
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # Torn last line from a crash in the middle of a write.
+                    continue
+        return records
+
+    def _recover_inflight(self) -> int:
+        """Write the batch that was being flushed when the process stopped.
+
+        The batch may already have committed, and later journal entries were
+        recorded on top of it (an unlike after a flushed like, say), so it is
+        written again as its own batch before the main journal is replayed.
+        The write queries are idempotent, so a second write is harmless. If
+        Neo4j is unreachable this raises and both journal files are kept."""
+        records = self._read_journal(self.inflight_path)
+        for record in records:
+            self._apply(record)
+        # Comments and services discarded later must not be written. They can
+        # only refer to this batch if its write failed and was requeued.
+        for record in self._read_journal(self.journal_path):
+            if record["op"] in ("uncomment", "drop_service"):
+                self._apply(record)
+        likes, buys, comments = self._likes, self._buys, self._comments
+        self._likes, self._buys, self._comments = {}, {}, {}
+        if likes or buys or comments:
+            self._write(likes, buys, comments)
+        if os.path.exists(self.inflight_path):
+            os.remove(self.inflight_path)
+        if records:
+            logger.info("Write-behind rewrote %d events from the interrupted batch", len(records))
+        return len(records)
+
+    def _replay_journal(self) -> int:
+        replayed = 0
+        for record in self._read_journal(self.journal_path):
+            self._apply(record)
+            replayed += 1
+        if replayed:
+            logger.info("Write-behind replayed %d journaled events", replayed)
+        return replayed
+
+write_behind = (
+    WriteBehindQueue(WRITE_BEHIND_FLUSH_INTERVAL_MS, WRITE_BEHIND_MAX_EVENTS,
+                     WRITE_BEHIND_DURABILITY, WRITE_BEHIND_JOURNAL_PATH)
+    if WRITE_BEHIND_ENABLED else None
+)
+
+@app.on_event("startup")
+def start_write_behind():
+    if write_behind is not None:
+        write_behind.start()
+
+@app.on_event("shutdown")
+def flush_write_behind():
+    if write_behind is not None:
+        write_behind.stop()
+
+SNAPSHOT_FORMAT = "connect-nitt-snapshot"
+SNAPSHOT_VERSION = 2
+SNAPSHOT_USER_LABELS = ["Student", "Alumni", "Faculty"]
+
+class GraphCache:
+    """In-process index of user names by email and known service names, so
+    write-behind events can be validated without a round trip to Neo4j.
+    Entries confirmed by Neo4j expire after ttl_seconds and entries loaded from
+    a snapshot after warm_ttl_seconds; events that still miss at flush time are
+    counted in WriteBehindQueue.dropped_events."""
+
+    def __init__(self, ttl_seconds: float, warm_ttl_seconds: float):
+        self.ttl = ttl_seconds
+        self.warm_ttl = warm_ttl_seconds
+        self._lock = threading.Lock()
+        # email -> (name, expires_at)
+        self._user_names = {}
+        # service name -> expires_at
+        self._services = {}
+
+    def lookup(self, service_name: str, user_email: str) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            service_expires = self._services.get(service_name, 0)
+            user = self._user_names.get(user_email)
+            if service_expires > now and user is not None and user[1] > now:
+                return {"user_name": user[0]}
+        return None
+
+    def remember(self, service_name: str, user_email: str, user_name: Optional[str]):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._services[service_name] = expires_at
+            self._user_names[user_email] = (user_name, expires_at)
+
+    def forget_service(self, service_name: str):
+        with self._lock:
+            self._services.pop(service_name, None)
+
+    def clear(self):
+        with self._lock:
+            self._user_names.clear()
+            self._services.clear()
+
+    def load_nodes(self, label: str, columns: Dict[str, Dict[str, List[Any]]]):
+        """Add a node chunk from a snapshot file."""
+        expires_at = time.monotonic() + self.warm_ttl
+        columns = columns["props"]
+        with self._lock:
+            if label in SNAPSHOT_USER_LABELS:
+                emails = columns.get("email", [])
+                names = columns.get("name", [None] * len(emails))
+                for email, name in zip(emails, names):
+                    if email is not None:
+                        self._user_names[email] = (name, expires_at)
+            elif label == "Service_Available":
+                for name in columns.get("name", []):
+                    if name is not None:
+                        self._services[name] = expires_at
+
+    def warm_from_snapshot(self, path: str):
+        for chunk in read_snapshot(path):
+            if chunk["kind"] == "nodes":
+                self.load_nodes(chunk["label"], chunk["columns"])
+        logger.info("Warmed cache from %s: %d users, %d services",
+                    path, len(self._user_names), len(self._services))
+
+graph_cache = GraphCache(GRAPH_CACHE_TTL_SECONDS, GRAPH_CACHE_WARM_TTL_SECONDS)
+
+@app.on_event("startup")
+def warm_graph_cache():
+    if SNAPSHOT_WARM_PATH:
+        graph_cache.warm_from_snapshot(SNAPSHOT_WARM_PATH)
+
+def _encode_snapshot_value(value):
+    if isinstance(value, Neo4jDateTime):
+        return {"$datetime": value.to_native().isoformat()}
+    raise TypeError(f"Cannot store {type(value).__name__} in a snapshot")
+
+def _decode_snapshot_value(obj):
+    if len(obj) == 1 and isinstance(obj.get("$datetime"), str):
+        return datetime.fromisoformat(obj["$datetime"])
+    return obj
+
+def _snapshot_identifier(name: str) -> str:
+    # Labels and relationship types are interpolated into Cypher, so only
+    # plain identifiers are accepted.
+    if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", name or ""):
+        raise ValueError(f"Invalid label or relationship type in snapshot: {name!r}")
+    return name
+
+def _to_columns(rows: List[Dict[str, Any]], fields: List[str]) -> Dict[str, Dict[str, List[Any]]]:
+    """Turn rows of {field..., props} into one list per field and per property.
+    Fields and properties are kept apart so any property name round-trips."""
+    keys = sorted({key for row in rows for key in row["props"]})
+    return {
+        "fields": {field: [row[field] for row in rows] for field in fields},
+        "props": {key: [row["props"].get(key) for row in rows] for key in keys},
+    }
+
+def _from_columns(columns: Dict[str, Dict[str, List[Any]]], fields: List[str]) -> List[Dict[str, Any]]:
+    size = len(columns["fields"][fields[0]])
+    rows = []
+    for i in range(size):
+        row = {field: columns["fields"][field][i] for field in fields}
+        row["props"] = {key: values[i] for key, values in columns["props"].items()
+                        if values[i] is not None}
+        rows.append(row)
+    return rows
+
+def _stream_batches(query: str, params: Dict[str, Any] = None):
+    """Run a read query and yield its rows SNAPSHOT_BATCH_SIZE at a time."""
+    with driver.session(database=NEO4J_DATABASE, fetch_size=SNAPSHOT_BATCH_SIZE) as session:
+        batch = []
+        for record in session.run(query, params or {}):
+            batch.append(record.data())
+            if len(batch) == SNAPSHOT_BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+def snapshot_path(name: str) -> str:
+    """Resolve a snapshot file name under SNAPSHOT_DIR, rejecting anything that
+    is not a bare file name."""
+    if not re.fullmatch(r"[A-Za-z0-9][A-Za-z0-9._-]*", name or "") or ".." in name:
+        raise ValueError(f"Invalid snapshot name: {name!r}")
+    directory = os.path.realpath(SNAPSHOT_DIR)
+    path = os.path.realpath(os.path.join(directory, name))
+    if os.path.dirname(path) != directory:
+        raise ValueError(f"Invalid snapshot name: {name!r}")
+    return path
+
+def read_snapshot(path: str):
+    """Check the header of a snapshot file and return an iterator over its chunks."""
+    f = gzip.open(path, "rt", encoding="utf-8")
+    try:
+        header = json.loads(f.readline() or "{}")
+    except (OSError, ValueError):
+        f.close()
+        raise ValueError(f"{path} is not a Connect-NITT snapshot")
+    if header.get("format") != SNAPSHOT_FORMAT or header.get("version") != SNAPSHOT_VERSION:
+        f.close()
+        raise ValueError(f"{path} is not a Connect-NITT snapshot")
+
+    def chunks():
+        with f:
+            while True:
+                try:
+                    line = f.readline()
+                    if not line:
+                        return
+                    chunk = json.loads(line, object_hook=_decode_snapshot_value)
+                except (EOFError, OSError, zlib.error, ValueError) as e:
+                    raise ValueError(f"{path} is truncated or corrupt") from e
+                yield chunk
+    return chunks()
+
+def export_snapshot(path: str) -> Dict[str, Dict[str, int]]:
+    """Stream every snapshot label and the relationships between them to a
+    gzipped file of column-oriented chunks, one JSON document per line."""
+    if write_behind is not None:
+        write_behind.flush()
+    counts = {"nodes": {}, "relationships": {}}
+
+    def write(f, doc):
+        f.write(json.dumps(doc, separators=(",", ":"), default=_encode_snapshot_value) + "\n")
+
+    # Write next to the target and swap it in at the end, so a failed export
+    # never leaves a truncated snapshot behind.
+    tmp_path = path + ".tmp"
+    try:
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            write(f, {"format": SNAPSHOT_FORMAT, "version": SNAPSHOT_VERSION,
+                      "created_at": utc_now_iso(), "labels": SNAPSHOT_LABELS})
+            for label in SNAPSHOT_LABELS:
+                query = f"MATCH (n:{label}) RETURN id(n) AS ref, properties(n) AS props"
+                for rows in _stream_batches(query):
+                    write(f, {"kind": "nodes", "label": label, "columns": _to_columns(rows, ["ref"])})
+                    counts["nodes"][label] = counts["nodes"].get(label, 0) + len(rows)
+
+            query = """
+            MATCH (a)-[r]->(b)
+            WHERE any(l IN labels(a) WHERE l IN $labels)
+            AND any(l IN labels(b) WHERE l IN $labels)
+            RETURN type(r) AS type, id(a) AS start, id(b) AS end, properties(r) AS props
+            """
+            for rows in _stream_batches(query, {"labels": SNAPSHOT_LABELS}):
+                by_type = {}
+                for row in rows:
+                    by_type.setdefault(row["type"], []).append(row)
+                for rel_type, typed_rows in by_type.items():
+                    write(f, {"kind": "relationships", "type": rel_type,
+                              "columns": _to_columns(typed_rows, ["start", "end"])})
+                    counts["relationships"][rel_type] = counts["relationships"].get(rel_type, 0) + len(typed_rows)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    return counts
+
+# Held for the whole of a snapshot import. Imported Comment nodes have no
+# HAS_COMMENT edge until the relationship chunks are written, so maintenance
+# takes this lock too instead of deleting them as orphans.
+snapshot_import_lock = threading.Lock()
+
+def import_snapshot(path: str, replace: bool = False) -> Dict[str, Dict[str, int]]:
+    """Recreate the nodes and relationships of a snapshot with one UNWIND
+    transaction per chunk. With replace=True the snapshot labels are wiped first;
+    otherwise the graph must not have any nodes with those labels yet."""
+    with snapshot_import_lock:
+        if write_behind is not None:
+            write_behind.flush()
+        # Read the whole file once so a truncated or corrupt snapshot is
+        # rejected before anything is deleted or written.
+        for _ in read_snapshot(path):
+            pass
+        chunks = read_snapshot(path)
+        if not replace:
+            query = """
+            MATCH (n) WHERE any(l IN labels(n) WHERE l IN $labels)
+            RETURN 1 AS found
+            LIMIT 1
+            """
+            if run_read_query(query, {"labels": SNAPSHOT_LABELS}):
+                raise ValueError("The graph already has snapshot data; import with replace "
+                                 "to wipe it first")
+        if replace:
+            query = """
+            MATCH (n) WHERE any(l IN labels(n) WHERE l IN $labels)
+            WITH n LIMIT $limit
+            DETACH DELETE n
+            RETURN count(*) AS deleted
+            """
+            while run_read_query(query, {"labels": SNAPSHOT_LABELS, "limit": SNAPSHOT_BATCH_SIZE})[0]["deleted"]:
+                pass
+            graph_cache.clear()
+
+        counts = {"nodes": {}, "relationships": {}}
+        # Snapshot node ref -> id of the node created for it in this database
+        node_ids = {}
+        for chunk in chunks:
+            if chunk["kind"] == "nodes":
+                label = _snapshot_identifier(chunk["label"])
+                query = f"""
+                UNWIND $rows AS row
+                CREATE (n:{label})
+                SET n = row.props
+                RETURN row.ref AS ref, id(n) AS id
+                """
+                created = run_read_query(query, {"rows": _from_columns(chunk["columns"], ["ref"])})
+                node_ids.update((row["ref"], row["id"]) for row in created)
+                graph_cache.load_nodes(label, chunk["columns"])
+                counts["nodes"][label] = counts["nodes"].get(label, 0) + len(created)
+            elif chunk["kind"] == "relationships":
+                rel_type = _snapshot_identifier(chunk["type"])
+                rows = [
+                    {"start": node_ids[row["start"]], "end": node_ids[row["end"]], "props": row["props"]}
+                    for row in _from_columns(chunk["columns"], ["start", "end"])
+                    if row["start"] in node_ids and row["end"] in node_ids
+                ]
+                query = f"""
+                UNWIND $rows AS row
+                MATCH (a) WHERE id(a) = row.start
+                MATCH (b) WHERE id(b) = row.end
+                CREATE (a)-[r:{rel_type}]->(b)
+                SET r = row.props
+                """
+                run_write_query(query, {"rows": rows})
+                counts["relationships"][rel_type] = counts["relationships"].get(rel_type, 0) + len(rows)
+        return counts
+
+# Each maintenance query removes at most $limit items in its own transaction
+# and reports how many it removed; it is repeated until nothing is left.
+MAINTENANCE_JOBS = [
+    ("orphan_comments", """
+    MATCH (c:Comment) WHERE NOT ()-[:HAS_COMMENT]->(c)
+    WITH c LIMIT $limit
+    DETACH DELETE c
+    RETURN count(*) AS removed
+    """),
+    ("expired_friend_requests", """
+    MATCH ()-[r:FRIEND_REQUEST]->()
+    WHERE r.status = 'pending' AND r.sent_at < datetime() - duration({days: $expiry_days})
+    WITH r LIMIT $limit
+    DELETE r
+    RETURN count(*) AS removed
+    """),
+]
+
+# Ids of every FRIENDS_WITH edge beyond the oldest one per direction. Collected
+# once per run and then deleted MAINTENANCE_BATCH_SIZE edges at a time.
+DUPLICATE_FRIENDSHIPS_QUERY = """
+MATCH (a)-[r:FRIENDS_WITH]->(b)
+WITH a, b, r ORDER BY r.since
+WITH a, b, collect(id(r)) AS rels
+WHERE size(rels) > 1
+UNWIND tail(rels) AS duplicate
+RETURN duplicate
+"""
+
+# Only deletes an edge if another FRIENDS_WITH edge in the same direction is
+# still there, in case the friendship changed since the ids were collected.
+DELETE_DUPLICATE_FRIENDSHIPS_QUERY = """
+UNWIND $ids AS rel_id
+MATCH (a)-[r:FRIENDS_WITH]->(b) WHERE id(r) = rel_id
+AND size([(a)-[other:FRIENDS_WITH]->(b) WHERE other <> r | other]) > 0
+DELETE r
+RETURN count(*) AS removed
+"""
+
+class MaintenanceScheduler:
+    """Background thread that periodically removes orphaned comments, expired
+    friend requests and duplicate FRIENDS_WITH edges in small batches."""
+
+    def __init__(self, interval_seconds: int, batch_size: int, batch_pause_ms: int, expiry_days: int):
+        self.interval = interval_seconds
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause_ms / 1000.0
+        self.expiry_days = expiry_days
+        self.last_report = None
+        self._run_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run_once(self) -> Dict[str, Any]:
+        """Run every job to completion and return what was reclaimed."""
+        with self._run_lock, snapshot_import_lock:
+            report = {"started_at": utc_now_iso()}
+            for name, query in MAINTENANCE_JOBS:
+                report[name] = self._run_job(query)
+            report["duplicate_friendships"] = self._remove_duplicate_friendships()
+            report["finished_at"] = utc_now_iso()
+            self.last_report = report
+        logger.info("Maintenance finished: %s", report)
+        return report
+
+    def _run_job(self, query: str) -> int:
+        params = {"limit": self.batch_size, "expiry_days": self.expiry_days}
+        total = 0
+        while not self._stopped.is_set():
+            removed = run_read_query(query, params)[0]["removed"]
+            total += removed
+            if removed == 0:
+                break
+            # Give other writers a chance at the locks between batches.
+            self._stopped.wait(self.batch_pause)
+        return total
+
+    def _remove_duplicate_friendships(self) -> int:
+        ids = [row["duplicate"] for row in run_read_query(DUPLICATE_FRIENDSHIPS_QUERY)]
+        total = 0
+        for start in range(0, len(ids), self.batch_size):
+            if self._stopped.is_set():
+                break
+            if start:
+                self._stopped.wait(self.batch_pause)
+            batch = ids[start:start + self.batch_size]
+            total += run_read_query(DELETE_DUPLICATE_FRIENDSHIPS_QUERY, {"ids": batch})[0]["removed"]
+        return total
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Maintenance run failed")
+
+maintenance = MaintenanceScheduler(MAINTENANCE_INTERVAL_SECONDS, MAINTENANCE_BATCH_SIZE,
+                                   MAINTENANCE_BATCH_PAUSE_MS, FRIEND_REQUEST_EXPIRY_DAYS)
+
+@app.on_event("startup")
+def start_maintenance():
+    if MAINTENANCE_ENABLED:
+        maintenance.start()
+
+@app.on_event("shutdown")
+def stop_maintenance():
+    maintenance.stop()
+
 @app.post("/init/create_department")
 def create_department(d: DepartmentModel):
     query = """
@@ -422,8 +1215,34 @@ def get_service_details(service_name: str):
         raise HTTPException(status_code=404, detail="Service not found")
     return rows[0]
 
+SERVICE_AND_USER_QUERY = """
+MATCH (s:Service_Available {name:$service_name})
+MATCH (u) WHERE u.email = $user_email
+OPTIONAL MATCH (u)-[like:LIKES]->(s)
+RETURN u.name AS user_name, count(like) > 0 AS liked
+LIMIT 1
+"""
+
+def lookup_service_and_user(service_name: str, user_email: str, with_like_state: bool = False):
+    """Validate a service/user pair before queueing a write-behind event."""
+    if not with_like_state:
+        cached = graph_cache.lookup(service_name, user_email)
+        if cached is not None:
+            return cached
+    rows = run_read_query(SERVICE_AND_USER_QUERY, {"service_name": service_name, "user_email": user_email})
+    if not rows:
+        return None
+    graph_cache.remember(service_name, user_email, rows[0]["user_name"])
+    return rows[0]
+
 @app.post("/buy_service")
 def buy_service(buy: BuyServiceModel):
+    if write_behind is not None:
+        if lookup_service_and_user(buy.service_name, buy.buyer_email) is None:
+            raise HTTPException(status_code=404, detail="Service or buyer not found")
+        write_behind.buy(buy.service_name, buy.buyer_email)
+        return {"message": "Service registered as used successfully"}
+
     query = """
     MATCH (s:Service_Available {name:$service_name})
     MATCH (p) WHERE p.email = $buyer_email
@@ -438,6 +1257,18 @@ def buy_service(buy: BuyServiceModel):
 
 @app.post("/services/like")
 def like_service(req: LikeServiceModel):
+    if write_behind is not None:
+        liked = write_behind.liked_state(req.service_name, req.user_email)
+        if liked is None:
+            found = lookup_service_and_user(req.service_name, req.user_email, with_like_state=True)
+            if found is None:
+                raise HTTPException(status_code=404, detail="Service or user not found")
+            liked = found["liked"]
+        write_behind.like(req.service_name, req.user_email, base=liked, liked=not liked)
+        if liked:
+            return {"message": "Service unliked", "liked": False}
+        return {"message": "Service liked", "liked": True}
+
     check_query = """
     MATCH (u)-[like:LIKES]->(s:Service_Available {name:$service_name})
     WHERE u.email = $user_email
@@ -470,6 +1301,22 @@ def like_service(req: LikeServiceModel):
 @app.post("/services/comment")
 def comment_on_service(req: CommentServiceModel):
     """Add a comment to a service."""
+    if write_behind is not None:
+        found = lookup_service_and_user(req.service_name, req.user_email)
+        if found is None:
+            raise HTTPException(status_code=404, detail="Service or user not found")
+        comment = write_behind.comment(req.service_name, req.user_email, req.comment_text)
+        return {
+            "message": "Comment added successfully",
+            "comment": {
+                "id": comment["id"],
+                "text": comment["comment_text"],
+                "user_email": comment["user_email"],
+                "user_name": found["user_name"],
+                "created_at": comment["created_at"]
+            }
+        }
+
     query = """
     MATCH (s:Service_Available {name:$service_name})
     MATCH (u) WHERE u.email = $user_email
@@ -500,6 +1347,10 @@ def comment_on_service(req: CommentServiceModel):
 @app.delete("/services/comment")
 def delete_comment(req: DeleteCommentModel):
     """Delete a comment (only by the comment author)."""
+    if write_behind is not None:
+        if write_behind.discard_comment(req.service_name, req.user_email, req.comment_id):
+            return {"message": "Comment deleted successfully"}
+
     query = """
     MATCH (s:Service_Available {name:$service_name})-[:HAS_COMMENT]->(comment:Comment {id:$comment_id})
     WHERE comment.user_email = $user_email
@@ -646,10 +1497,14 @@ def get_received_friend_requests(email: str):
 @app.delete("/services/{name}")
 def delete_service(name: str):
     """Delete a service provided by a user."""
+    graph_cache.forget_service(name)
+    if write_behind is not None:
+        write_behind.discard_service(name)
     query = """
     MATCH (s:Service_Available {name:$name})
-    DETACH DELETE s
-    RETURN count(s) as deleted
+    OPTIONAL MATCH (s)-[:HAS_COMMENT]->(c:Comment)
+    DETACH DELETE s, c
+    RETURN count(DISTINCT s) as deleted
     """
     rows = run_read_query(query, {"name": name})
     return {"message": "Service deleted successfully"}
@@ -714,10 +1569,76 @@ def get_departments():
     query = "MATCH (d:Department) RETURN d{.*} AS department"
     return run_read_query(query)
 
+@app.post("/admin/snapshot/export")
+def export_snapshot_endpoint(req: SnapshotModel):
+    """Write all snapshot labels and their relationships to SNAPSHOT_DIR/req.name."""
+    try:
+        path = snapshot_path(req.name)
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        counts = export_snapshot(path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OSError as e:
+        logger.exception("Snapshot export to %s failed", req.name)
+        raise HTTPException(status_code=500, detail=f"Could not write snapshot: {e.strerror or e}")
+    except TypeError as e:
+        # A property type _encode_snapshot_value does not know how to store.
+        logger.exception("Snapshot export to %s failed", req.name)
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"message": f"Snapshot written to {req.name}", **counts}
+
+@app.post("/admin/snapshot/import")
+def import_snapshot_endpoint(req: SnapshotModel):
+    """Restore SNAPSHOT_DIR/req.name, optionally wiping the existing graph first."""
+    try:
+        counts = import_snapshot(snapshot_path(req.name), replace=req.replace)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Snapshot file not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OSError as e:
+        logger.exception("Snapshot import from %s failed", req.name)
+        raise HTTPException(status_code=500, detail=f"Could not read snapshot: {e.strerror or e}")
+    return {"message": f"Snapshot restored from {req.name}", **counts}
+
+@app.get("/admin/maintenance")
+def get_maintenance_report():
+    """Report of the last maintenance run."""
+    if maintenance.last_report is None:
+        return {"message": "Maintenance has not run yet"}
+    return maintenance.last_report
+
+@app.post("/admin/maintenance/run")
+def run_maintenance():
+    """Run the maintenance jobs now and report what was reclaimed."""
+    return maintenance.run_once()
+
 @app.get("/")
 def root():
     return {"message": "Connect-NITT FastAPI backend is running with social features"}
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="localhost", port=8001)
\ No newline at end of file
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] in ("export-snapshot", "import-snapshot"):
+        # python main.py export-snapshot graph.snapshot.gz
+        # python main.py import-snapshot graph.snapshot.gz [--replace]
+        import argparse
+        parser = argparse.ArgumentParser(prog="main.py")
+        commands = parser.add_subparsers(dest="command", required=True)
+        commands.add_parser("export-snapshot").add_argument("path")
+        import_parser = commands.add_parser("import-snapshot")
+        import_parser.add_argument("path")
+        import_parser.add_argument("--replace", action="store_true",
+                                   help="delete the existing snapshot labels before importing")
+        args = parser.parse_args()
+        try:
+            if args.command == "export-snapshot":
+                counts = export_snapshot(args.path)
+            else:
+                counts = import_snapshot(args.path, replace=args.replace)
+        except ValueError as e:
+            sys.exit(f"error: {e}")
+        print(json.dumps(counts, indent=2))
+    else:
+        import uvicorn
+        uvicorn.run(app, host="localhost", port=8001)
\ No newline at end of file
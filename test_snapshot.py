@@ -0,0 +1,129 @@
+import gzip
+import json
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("neo4j")
+pytest.importorskip("email_validator")
+
+from neo4j.time import DateTime
+
+import main
+
+
+def write_snapshot(path, chunks, header=None):
+    if header is None:
+        header = {"format": main.SNAPSHOT_FORMAT, "version": main.SNAPSHOT_VERSION}
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for doc in [header] + chunks:
+            f.write(json.dumps(doc, default=main._encode_snapshot_value) + "\n")
+
+
+def node_chunk(label, rows):
+    return {"kind": "nodes", "label": label, "columns": main._to_columns(rows, ["ref"])}
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "SNAPSHOT_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_snapshot_path_resolves_inside_snapshot_dir(snapshot_dir):
+    assert main.snapshot_path("graph.snapshot.gz") == os.path.join(
+        os.path.realpath(snapshot_dir), "graph.snapshot.gz")
+
+
+@pytest.mark.parametrize("name", ["", "..", "../main.py", "a/b", "a\\b", "/etc/passwd", ".hidden"])
+def test_snapshot_path_rejects_anything_but_a_file_name(snapshot_dir, name):
+    with pytest.raises(ValueError):
+        main.snapshot_path(name)
+
+
+def test_columns_round_trip_keeps_fields_and_props_apart():
+    rows = [
+        {"ref": 5, "props": {"name": "A", "_ref": "mine", "_start": 1}},
+        {"ref": 6, "props": {"name": "B", "dob": None}},
+    ]
+    columns = main._to_columns(rows, ["ref"])
+    assert columns["fields"] == {"ref": [5, 6]}
+    assert main._from_columns(columns, ["ref"]) == [
+        {"ref": 5, "props": {"name": "A", "_ref": "mine", "_start": 1}},
+        {"ref": 6, "props": {"name": "B"}},
+    ]
+
+
+def test_datetime_values_round_trip():
+    value = DateTime.from_native(datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc))
+    doc = json.dumps({"props": {"at": [value], "$datetime": ["not a timestamp"]}},
+                     default=main._encode_snapshot_value)
+    decoded = json.loads(doc, object_hook=main._decode_snapshot_value)
+    assert decoded["props"]["at"] == [datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)]
+    assert decoded["props"]["$datetime"] == ["not a timestamp"]
+
+
+def test_unsupported_values_are_rejected():
+    with pytest.raises(TypeError):
+        json.dumps({"value": object()}, default=main._encode_snapshot_value)
+
+
+def test_read_snapshot_yields_chunks(tmp_path):
+    path = str(tmp_path / "graph.snapshot.gz")
+    chunk = node_chunk("Student", [{"ref": 1, "props": {"email": "a@x.com"}}])
+    write_snapshot(path, [chunk])
+    assert list(main.read_snapshot(path)) == [chunk]
+
+
+@pytest.mark.parametrize("header", [{}, {"format": "something-else", "version": 2},
+                                    {"format": "connect-nitt-snapshot", "version": 1}])
+def test_read_snapshot_checks_header(tmp_path, header):
+    path = str(tmp_path / "graph.snapshot.gz")
+    write_snapshot(path, [], header=header)
+    with pytest.raises(ValueError):
+        main.read_snapshot(path)
+
+
+def test_read_snapshot_rejects_non_gzip_file(tmp_path):
+    path = tmp_path / "graph.snapshot.gz"
+    path.write_text("not a snapshot")
+    with pytest.raises(ValueError):
+        main.read_snapshot(str(path))
+
+
+def test_read_snapshot_rejects_truncated_file(tmp_path):
+    path = tmp_path / "graph.snapshot.gz"
+    rows = [{"ref": i, "props": {"email": f"{i}@x.com"}} for i in range(100)]
+    write_snapshot(str(path), [node_chunk("Student", rows)])
+    path.write_bytes(path.read_bytes()[:-6])
+    with pytest.raises(ValueError):
+        list(main.read_snapshot(str(path)))
+
+
+def test_import_rejects_truncated_file_before_touching_the_database(tmp_path, monkeypatch):
+    queries = []
+    monkeypatch.setattr(main, "run_read_query", lambda query, params=None: queries.append(query) or [])
+    path = tmp_path / "graph.snapshot.gz"
+    write_snapshot(str(path), [node_chunk("Student", [{"ref": 1, "props": {"email": "a@x.com"}}])])
+    path.write_bytes(path.read_bytes()[:-6])
+    with pytest.raises(ValueError):
+        main.import_snapshot(str(path), replace=True)
+    assert queries == []
+
+
+def test_import_without_replace_refuses_populated_graph(tmp_path, monkeypatch):
+    queries = []
+
+    def run_read_query(query, params=None):
+        queries.append(query)
+        return [{"found": 1}]
+
+    monkeypatch.setattr(main, "run_read_query", run_read_query)
+    path = str(tmp_path / "graph.snapshot.gz")
+    write_snapshot(path, [node_chunk("Student", [{"ref": 1, "props": {"email": "a@x.com"}}])])
+    with pytest.raises(ValueError):
+        main.import_snapshot(path)
+    assert len(queries) == 1
+    assert "CREATE" not in queries[0]
@@ -0,0 +1,190 @@
+import os
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("neo4j")
+pytest.importorskip("email_validator")
+
+import main
+
+
+class RecordingWrite:
+    """Stands in for WriteBehindQueue._write and records every batch."""
+
+    def __init__(self):
+        self.batches = []
+        self.fail = False
+        self.during_write = None
+
+    def __call__(self, likes, buys, comments):
+        if self.during_write is not None:
+            self.during_write()
+            self.during_write = None
+        if self.fail:
+            raise RuntimeError("database unavailable")
+        self.batches.append((dict(likes), dict(buys), dict(comments)))
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / "write_behind.journal")
+
+
+def make_queue(journal_path, durability="journal"):
+    queue = main.WriteBehindQueue(3600 * 1000, 10 ** 6, durability, journal_path)
+    queue._write = RecordingWrite()
+    return queue
+
+
+def test_like_then_unlike_cancels_out(journal_path):
+    queue = make_queue(journal_path)
+    queue.start()
+    queue.like("svc", "a@x.com", base=False, liked=True)
+    assert queue.liked_state("svc", "a@x.com") is True
+    queue.like("svc", "a@x.com", base=True, liked=False)
+    assert queue.liked_state("svc", "a@x.com") is None
+    assert queue.flush() == 0
+    queue.stop()
+    assert queue._write.batches == []
+
+
+def test_flush_writes_coalesced_batch(journal_path):
+    queue = make_queue(journal_path)
+    queue.start()
+    queue.like("svc", "a@x.com", base=True, liked=False)
+    queue.buy("svc", "a@x.com")
+    queue.buy("svc", "a@x.com")
+    comment = queue.comment("svc", "a@x.com", "hello")
+    assert queue.flush() == 3
+    queue.stop()
+    likes, buys, comments = queue._write.batches[0]
+    assert likes[("svc", "a@x.com")][1] is False
+    assert list(buys) == [("svc", "a@x.com")]
+    assert list(comments) == [comment["id"]]
+
+
+def test_failed_flush_requeues_and_newer_events_win(journal_path):
+    queue = make_queue(journal_path)
+    queue.start()
+    queue.like("svc", "a@x.com", base=False, liked=True)
+    queue.like("svc", "b@x.com", base=False, liked=True)
+    # a@x.com unlikes while the batch with their like is being written.
+    queue._write.during_write = lambda: queue.like("svc", "a@x.com", base=True, liked=False)
+    queue._write.fail = True
+    with pytest.raises(RuntimeError):
+        queue.flush()
+    assert queue.failed_flushes == 1
+    assert queue.liked_state("svc", "a@x.com") is None
+    assert queue.liked_state("svc", "b@x.com") is True
+
+    queue._write.fail = False
+    assert queue.flush() == 1
+    queue.stop()
+    likes, _, _ = queue._write.batches[0]
+    assert list(likes) == [("svc", "b@x.com")]
+
+
+def test_journal_is_replayed_after_crash(journal_path):
+    queue = make_queue(journal_path)
+    queue.start()
+    queue.like("svc", "a@x.com", base=False, liked=True)
+    queue._write.fail = True
+    with pytest.raises(RuntimeError):
+        queue.flush()
+    queue.like("svc", "a@x.com", base=True, liked=False)
+    queue.buy("svc", "b@x.com")
+    comment = queue.comment("svc", "b@x.com", "kept")
+    dropped = queue.comment("svc", "b@x.com", "deleted")
+    assert queue.discard_comment("svc", "b@x.com", dropped["id"])
+    # Simulate a crash: stop the thread without the final flush.
+    queue._stopped.set()
+    queue._wakeup.set()
+    queue._thread.join()
+    queue._journal.close()
+
+    restarted = make_queue(journal_path)
+    # The failed batch with the like is written first ...
+    assert restarted._recover_inflight() == 1
+    likes, _, _ = restarted._write.batches[0]
+    assert likes[("svc", "a@x.com")][1] is True
+    # ... and the later unlike is replayed on top of it.
+    assert restarted._replay_journal() == 5
+    assert restarted._likes[("svc", "a@x.com")][1] is False
+    assert list(restarted._buys) == [("svc", "b@x.com")]
+    assert list(restarted._comments) == [comment["id"]]
+
+
+class Crash(BaseException):
+    pass
+
+
+def test_unlike_during_committed_flush_survives_crash(journal_path):
+    queue = make_queue(journal_path)
+    queue.start()
+    queue.like("svc", "a@x.com", base=False, liked=True)
+    write = queue._write
+
+    def commit_then_crash(likes, buys, comments):
+        # The user unlikes while the like is being written, then the process
+        # dies after the commit but before the .inflight file is removed.
+        queue.like("svc", "a@x.com", base=True, liked=False)
+        write(likes, buys, comments)
+        raise Crash()
+
+    queue._write = commit_then_crash
+    with pytest.raises(Crash):
+        queue.flush()
+    queue._stopped.set()
+    queue._wakeup.set()
+    queue._thread.join()
+    queue._journal.close()
+    assert write.batches[0][0][("svc", "a@x.com")][1] is True
+
+    restarted = make_queue(journal_path)
+    restarted.start()
+    restarted.stop()
+    likes, _, _ = restarted._write.batches[-1]
+    assert likes[("svc", "a@x.com")][1] is False
+    assert not os.path.exists(journal_path + ".inflight")
+
+
+def test_comment_discarded_after_failed_flush_is_not_recovered(journal_path):
+    queue = make_queue(journal_path)
+    queue.start()
+    comment = queue.comment("svc", "a@x.com", "hello")
+    queue._write.fail = True
+    with pytest.raises(RuntimeError):
+        queue.flush()
+    assert queue.discard_comment("svc", "a@x.com", comment["id"])
+    queue._stopped.set()
+    queue._wakeup.set()
+    queue._thread.join()
+    queue._journal.close()
+
+    restarted = make_queue(journal_path)
+    restarted._recover_inflight()
+    restarted._replay_journal()
+    assert restarted._write.batches == []
+    assert restarted._comments == {}
+
+
+def test_discard_comment_checks_author(journal_path):
+    queue = make_queue(journal_path, durability="none")
+    comment = queue.comment("svc", "a@x.com", "hello")
+    assert not queue.discard_comment("svc", "b@x.com", comment["id"])
+    assert not queue.discard_comment("svc", "a@x.com", "unknown")
+    assert queue.discard_comment("svc", "a@x.com", comment["id"])
+    assert queue._comments == {}
+
+
+def test_discard_service_drops_its_events(journal_path):
+    queue = make_queue(journal_path, durability="none")
+    queue.like("svc", "a@x.com", base=False, liked=True)
+    queue.buy("svc", "a@x.com")
+    queue.comment("svc", "a@x.com", "hello")
+    queue.buy("other", "a@x.com")
+    queue.discard_service("svc")
+    assert queue._likes == {}
+    assert list(queue._buys) == [("other", "a@x.com")]
+    assert queue._comments == {}